@@ -0,0 +1,316 @@
+import argparse
+import gc
+import importlib.util
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "dbworkload"))
+
+from DatapointTransactions import Datapointtransactions
+
+
+def load_show_ranges():
+    # show-ranges.py is not importable by name because of the hyphen
+    spec = importlib.util.spec_from_file_location(
+        "show_ranges", os.path.join(HERE, "show-ranges.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeCursor:
+    def __init__(self, row):
+        self.row = row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        return self
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeConnection:
+    # Stands in for psycopg.Connection: every query answers with the
+    # same recorded (station, region) row used by create_datapoint().
+    def __init__(self, row):
+        self.row = row
+
+    def cursor(self):
+        return FakeCursor(self.row)
+
+
+def recorded_ranges(nodes=9, regions=("tx1", "tx2", "tx3"), replicas=5):
+    # Mimics the rows returned by SHOW RANGE ... FOR ROW:
+    # (range_id, lease_holder, replicas, replica_localities)
+    node_ids = list(range(1, nodes + 1))
+    picked = random.sample(node_ids, replicas)
+    localities = [f"region={regions[n % len(regions)]}" for n in picked]
+    return [(random.randint(1, 64), random.choice(picked), picked, localities)]
+
+
+def build_benchmarks(args):
+    # Each entry is a factory that builds the benchmark's inputs and returns
+    # the op to time. Factories are called right after random is reseeded,
+    # so every sample of every run draws the same inputs in the same order.
+    station_row = (uuid.UUID(int=args.seed), "tx1")
+    show_ranges = load_show_ranges()
+    row = {"station": str(station_row[0]), "at": "2025-01-01 00:00:00"}
+
+    def workload():
+        dp = Datapointtransactions({})
+        if not args.embed:
+            vector = [random.uniform(-1, 1) for _ in range(384)]
+            dp.embed_text = lambda text: vector
+        return dp
+
+    def create_datapoint():
+        dp = workload()
+        conn = FakeConnection(station_row)
+        return lambda: dp.create_datapoint(conn)
+
+    def random_json_object():
+        dp = workload()
+        return lambda: dp.random_json_object(
+                            random.randint(1, 10),
+                            random.randint(1, 10)
+                        )
+
+    def random_date():
+        dp = workload()
+        low = dp.init_random_ranges["date"]["low"]
+        high = dp.init_random_ranges["date"]["high"]
+        return lambda: dp.random_date(low, high)
+
+    def format_vector():
+        dp = workload()
+        vec = [random.uniform(-1, 1) for _ in range(384)]
+        return lambda: dp.format_vector(vec)
+
+    def parse_row_info():
+        ranges = itertools.cycle([recorded_ranges() for _ in range(256)])
+        return lambda: show_ranges.parse_row_info(row, next(ranges))
+
+    def merge_stats():
+        parsed = itertools.cycle([
+            show_ranges.parse_row_info(row, recorded_ranges()) for _ in range(256)
+        ])
+        range_stats = {}
+        return lambda: show_ranges.merge_stats(range_stats, next(parsed))
+
+    return {
+        "create_datapoint": create_datapoint,
+        "random_json_object": random_json_object,
+        "random_date": random_date,
+        "format_vector": format_vector,
+        "parse_row_info": parse_row_info,
+        "merge_stats": merge_stats,
+    }
+
+
+def seeded(factory, seed):
+    random.seed(seed)
+    return factory()
+
+
+def calibrate(factory, seed, seconds):
+    # Number of ops that takes roughly `seconds`. It is stored in the
+    # baseline and reused when comparing, so both runs do the same work.
+    fn = seeded(factory, seed)
+    ops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(ops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds / 10:
+            return max(1, int(ops * seconds / elapsed))
+        ops *= 2
+
+
+def measure_rate(factory, seed, ops):
+    # like timeit, keep the garbage collector from landing in some samples only
+    fn = seeded(factory, seed)
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(ops):
+            fn()
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+    return ops / elapsed
+
+
+def measure_rates(factory, seed, ops, repeats):
+    # Every sample runs the same `ops` ops on the same inputs, so the only
+    # difference between samples is interference from the rest of the host,
+    # which can only slow a sample down. As with timeit, the best sample is
+    # what gets compared; the spread is the interquartile range relative to
+    # the median, which a single outlier sample cannot inflate.
+    measure_rate(factory, seed, ops)  # warm-up, discarded
+    samples = [measure_rate(factory, seed, ops) for _ in range(repeats)]
+    median = statistics.median(samples)
+    q1, _, q3 = statistics.quantiles(samples, n=4)
+    return {
+        "ops_per_sample": ops,
+        "ops_per_sec": max(samples),
+        "ops_per_sec_samples": samples,
+        "ops_per_sec_spread": (q3 - q1) / median,
+    }
+
+
+def measure_peak(factory, seed, ops):
+    # Peak traced memory above the starting point while a single op runs,
+    # averaged over ops. This is not an allocation count: temporaries freed
+    # before the peak is reached are not seen.
+    # Measured in a separate pass since tracemalloc slows everything down.
+    fn = seeded(factory, seed)
+    total = 0
+    tracemalloc.start()
+    try:
+        for _ in range(ops):
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - base
+    finally:
+        tracemalloc.stop()
+
+    return total / ops
+
+
+def compare(results, baseline, threshold, noise_cap):
+    regressions = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            continue
+        # observed noise widens the allowed drop, but never by more than noise_cap
+        noise = min(noise_cap, max(b.get("ops_per_sec_spread", 0), r["ops_per_sec_spread"]))
+        allowed = threshold + noise
+        if r["ops_per_sec"] < b["ops_per_sec"] * (1 - allowed):
+            regressions.append(
+                f"{name}: best ops/sec {r['ops_per_sec']:.0f} < baseline {b['ops_per_sec']:.0f}"
+                f" (allowed -{allowed * 100:.1f}%)"
+            )
+        if "peak_bytes_per_op" in b and r["peak_bytes_per_op"] > b["peak_bytes_per_op"] * (1 + threshold):
+            regressions.append(
+                f"{name}: peak B/op {r['peak_bytes_per_op']:.0f} > baseline {b['peak_bytes_per_op']:.0f}"
+            )
+    return regressions
+
+
+def print_results(results, baseline):
+    headers = ["benchmark", "ops/sec (best)", "IQR", "peak B/op", "vs baseline"]
+    rows = []
+    for name, r in results.items():
+        delta = ""
+        if baseline and name in baseline:
+            b = baseline[name]["ops_per_sec"]
+            delta = f"{(r['ops_per_sec'] - b) / b * 100:+.1f}%"
+        rows.append([
+            name,
+            f"{r['ops_per_sec']:.0f}",
+            f"{r['ops_per_sec_spread'] * 100:.1f}%",
+            f"{r['peak_bytes_per_op']:.0f}",
+            delta,
+        ])
+
+    widths = [max(len(v) for v in col) for col in zip(headers, *rows)]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for r in rows:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline microbenchmarks for client-side hot paths (no database required)"
+    )
+    parser.add_argument("--seconds", type=float, default=0.3,
+                        help="approximate time per ops/sec sample, used to size new baselines")
+    parser.add_argument("--repeats", type=int, default=9,
+                        help="ops/sec samples taken per benchmark")
+    parser.add_argument("--peak-ops", type=int, default=200,
+                        help="ops traced when measuring peak memory")
+    parser.add_argument("--only", nargs="*",
+                        help="run only the named benchmarks")
+    parser.add_argument("--embed", action="store_true",
+                        help="include the real embedding model in create_datapoint")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", help="write results to this baseline file")
+    parser.add_argument("--compare", help="compare results against this baseline file")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change treated as a regression")
+    parser.add_argument("--noise-cap", type=float, default=0.05,
+                        help="most that observed noise may add to the threshold")
+    args = parser.parse_args()
+
+    if args.repeats < 4:
+        parser.error("--repeats must be at least 4 to compute an interquartile range")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        # replay the baseline's exact workload
+        args.seed = saved.get("seed", args.seed)
+        args.embed = saved.get("embed", args.embed)
+
+    benchmarks = build_benchmarks(args)
+    if args.only:
+        unknown = set(args.only) - set(benchmarks)
+        if unknown:
+            parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+        benchmarks = {k: v for k, v in benchmarks.items() if k in args.only}
+
+    results = {}
+    for name, factory in benchmarks.items():
+        if baseline and "ops_per_sample" in baseline.get(name, {}):
+            ops = baseline[name]["ops_per_sample"]
+        else:
+            ops = calibrate(factory, args.seed, args.seconds)
+        results[name] = measure_rates(factory, args.seed, ops, args.repeats)
+        results[name]["peak_bytes_per_op"] = measure_peak(factory, args.seed, args.peak_ops)
+
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "seed": args.seed,
+                "embed": args.embed,
+                "results": results,
+            }, f, indent=2)
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold, args.noise_cap)
+        if regressions:
+            print("\nRegressions:")
+            for r in regressions:
+                print(f"  {r}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
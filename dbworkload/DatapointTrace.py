@@ -0,0 +1,143 @@
+import glob
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+from multiprocessing import util
+
+import polars as pl
+
+
+# A trace is a directory of Arrow IPC files, one per chunk of recorded
+# datapoints. Files are written uncompressed so that replay can memory-map
+# them, and embeddings are stored as fixed-size float32 arrays rather than
+# the text literal sent to the database. Chunk files are named
+# {thread id}-{pid}-{seq}, so the chunks of one recorder sort together
+# and in order.
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+class TraceRecorder:
+    # Buffered rows are written out every `chunk_size` rows or `flush_interval`
+    # seconds. dbworkload runs workloads in multiprocessing processes, where
+    # atexit handlers never run, so the last partial chunk is flushed by a
+    # multiprocessing finalizer when the process shuts down gracefully;
+    # a killed process loses at most `flush_interval` seconds of rows.
+    def __init__(self, path: str, id: int, chunk_size: int = 1000, flush_interval: float = 10):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.prefix = f"{id:04d}-{os.getpid()}"
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.seq = 0
+        self.rows = []
+        self.start = time.perf_counter()
+        self.last_flush = self.start
+        self.lock = threading.Lock()
+        util.Finalize(self, self.flush, exitpriority=10)
+
+
+    def add(self, datapoint: dict):
+        now = time.perf_counter()
+        with self.lock:
+            self.rows.append((now - self.start, datapoint))
+            due = (
+                len(self.rows) >= self.chunk_size
+                or (self.flush_interval and now - self.last_flush >= self.flush_interval)
+            )
+        if due:
+            self.flush()
+
+
+    def flush(self):
+        with self.lock:
+            rows, self.rows = self.rows, []
+            self.last_flush = time.perf_counter()
+            if not rows:
+                return
+            seq = self.seq
+            self.seq += 1
+
+        dps = [dp for _, dp in rows]
+        df = pl.DataFrame([
+            pl.Series("t", [t for t, _ in rows], dtype=pl.Float64),
+            pl.Series("station", [dp["station"] for dp in dps], dtype=pl.String),
+            pl.Series("region", [dp["region"] for dp in dps], dtype=pl.String),
+            pl.Series("at", [datetime.strptime(dp["date"], DATE_FORMAT) for dp in dps],
+                      dtype=pl.Datetime("us")),
+            pl.Series("param0", [dp["param0"] for dp in dps], dtype=pl.Int64),
+            pl.Series("param1", [dp["param1"] for dp in dps], dtype=pl.Int64),
+            pl.Series("param2", [dp["param2"] for dp in dps], dtype=pl.Float64),
+            pl.Series("param3", [dp["param3"] for dp in dps], dtype=pl.Float64),
+            pl.Series("param4", [dp["param4"] for dp in dps], dtype=pl.String),
+            pl.Series("param5", [dp["param5"] for dp in dps], dtype=pl.String),
+            pl.Series("param6", [dp["embedding"] for dp in dps],
+                      dtype=pl.Array(pl.Float32, len(dps[0]["embedding"]))),
+        ])
+
+        # write then rename, so a reader never sees a partial chunk
+        final = os.path.join(self.path, f"{self.prefix}-{seq:06d}.arrow")
+        tmp = final + ".tmp"
+        df.write_ipc(tmp, compression="uncompressed")
+        os.replace(tmp, final)
+
+
+
+class TraceReader:
+    # Replays, forever, the chunks of the recorders assigned to one thread.
+    # Reader k replays recorders k, k + N, k + 2N... of the trace, where N is
+    # the replaying thread count, each recorder's chunks in order. Replaying
+    # with as many threads as recorded gives every thread one recorder; with
+    # more threads than recorders, the extra threads repeat a recorder.
+    #
+    # speed = 0     replay as fast as possible
+    # speed = 1     replay at the recorded rate
+    # speed = N     replay at N times the recorded rate
+    def __init__(self, path: str, id: int, total_thread_count: int, speed: float = 0):
+        files = sorted(glob.glob(os.path.join(path, "*.arrow")))
+        if not files:
+            raise RuntimeError(f"No trace chunks found in {path}")
+
+        recorders = [
+            list(chunks)
+            for _, chunks in itertools.groupby(files, key=lambda f: os.path.basename(f).rsplit("-", 1)[0])
+        ]
+        self.recorders = (
+            recorders[id % total_thread_count::total_thread_count]
+            or [recorders[id % len(recorders)]]
+        )
+        self.speed = speed
+
+
+    def rows(self):
+        while True:
+            for chunks in self.recorders:
+                # offsets are relative to the start of each recorder
+                start = time.perf_counter()
+                t0 = None
+
+                for f in chunks:
+                    df = pl.read_ipc(f, memory_map=True)
+                    for (t, station, region, at,
+                         param0, param1, param2, param3, param4, param5, param6) in df.iter_rows():
+                        if self.speed:
+                            if t0 is None:
+                                t0 = t
+                            delay = start + (t - t0) / self.speed - time.perf_counter()
+                            if delay > 0:
+                                time.sleep(delay)
+
+                        yield {
+                            "station":   station,
+                            "region":    region,
+                            "date":      at,
+                            "param0":    param0,
+                            "param1":    param1,
+                            "param2":    param2,
+                            "param3":    param3,
+                            "param4":    param4,
+                            "param5":    param5,
+                            "embedding": param6
+                        }
@@ -7,6 +7,8 @@ from datetime import datetime, timedelta
 import string
 import json
 from sentence_transformers import SentenceTransformer
+from RegionRouter import RegionRouter
+from DatapointTrace import TraceRecorder, TraceReader
 
 class Datapointtransactions:
 
@@ -14,6 +16,20 @@ class Datapointtransactions:
         # args = {
         #     "region":     a valid region from geos.crdb_region column
         #                   if no region specified, emulate station across all regions
+        #     "routes":     optional map of region -> connection URL (or list of URLs);
+        #                   each datapoint is written through a gateway in its region
+        #     "pool_size":  connections kept per routed region; by default one per
+        #                   workload thread in the process
+        #     "report_every": print routing statistics every N writes (default 1000)
+        #     "report_interval": ... or every N seconds, whichever comes first (default 10)
+        #     "record":     optional directory; generated datapoints are written there as a trace
+        #     "record_chunk": datapoints per trace chunk file (default 1000)
+        #     "record_flush": ... or seconds between chunk files, whichever comes first (default 10)
+        #     "replay":     optional directory of a recorded trace; its datapoints are
+        #                   ingested instead of generating new ones
+        #     "replay_speed": 0 replays as fast as possible (default), 1 at the recorded
+        #                   rate, N at N times the recorded rate
+        #     "record" and "replay" are mutually exclusive
         # }
 
         self.region = None
@@ -21,6 +37,30 @@ class Datapointtransactions:
             self.region = args["region"]
             print("Region: ", self.region)
 
+        self.router = None
+        self.gateway_region = None
+        if "routes" in args:
+            self.router = RegionRouter.shared(
+                args["routes"],
+                int(args["pool_size"]) if "pool_size" in args else None,
+                int(args.get("report_every", 1000)),
+                float(args.get("report_interval", 10))
+            )
+            self.router.attach()
+            print("Routes: ", ", ".join(sorted(args["routes"])))
+
+        self.record = args.get("record")
+        self.record_chunk = int(args.get("record_chunk", 1000))
+        self.record_flush = float(args.get("record_flush", 10))
+        self.replay = args.get("replay")
+        if self.record and self.replay:
+            raise ValueError("record and replay cannot be used together")
+        self.replay_speed = float(args.get("replay_speed", 0))
+        self.recorder = None
+        self.trace = None
+        # replayed row not yet written; kept across dbworkload's retries
+        self.pending = None
+
         self.init_random_ranges = {
             "interval": {
                 "low": 0,
@@ -62,6 +102,10 @@ class Datapointtransactions:
         return emb[0].tolist()
 
 
+    def format_vector(self, vec) -> str:
+        return "[" + ",".join(str(x) for x in vec) + "]"
+
+
     def random_date(self, d1, d2):
         retval = None
         date_range = d2 - d1
@@ -170,7 +214,8 @@ class Datapointtransactions:
             str(datapoint["param5"])
         ])
         vec = self.embed_text(datapoint_text)
-        datapoint["param6"] = "[" + ",".join(str(x) for x in vec) + "]"
+        datapoint["embedding"] = vec
+        datapoint["param6"] = self.format_vector(vec)
 
         return datapoint
 
@@ -186,6 +231,15 @@ class Datapointtransactions:
             )
             print(cur.execute(f"select version()").fetchone()[0])
 
+            if self.router:
+                # rows for regions without a route go through this connection
+                self.gateway_region = cur.execute("SELECT gateway_region()").fetchone()[0]
+
+        if self.replay:
+            self.trace = TraceReader(self.replay, id, total_thread_count, self.replay_speed).rows()
+        elif self.record:
+            self.recorder = TraceRecorder(self.record, id, self.record_chunk, self.record_flush)
+
 
 
     # the run() function returns a list of functions
@@ -199,9 +253,28 @@ class Datapointtransactions:
 
 
     def sql_insert_datapoint(self, conn: psycopg.Connection):
-        datapoint = self.create_datapoint(conn)
+        if self.trace:
+            if self.pending is None:
+                self.pending = next(self.trace)
+                self.pending["param6"] = self.format_vector(self.pending["embedding"])
+            datapoint = self.pending
+        else:
+            datapoint = self.create_datapoint(conn)
         # print(json.dumps(datapoint, indent=2))
 
+        if self.router:
+            with self.router.connection(datapoint["region"], conn, self.gateway_region) as rconn:
+                self.upsert_datapoint(rconn, datapoint)
+        else:
+            self.upsert_datapoint(conn, datapoint)
+
+        # only advance the trace, or record, once the row was actually written
+        self.pending = None
+        if self.recorder:
+            self.recorder.add(datapoint)
+
+
+    def upsert_datapoint(self, conn: psycopg.Connection, datapoint: dict):
         with conn.cursor() as cur:
             sql = """
                 UPSERT INTO datapoints
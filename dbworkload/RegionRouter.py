@@ -0,0 +1,244 @@
+import collections
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import util
+
+import psycopg
+
+
+class RegionPool:
+    # A small pool of autocommit connections to the gateways of one region.
+    # Connections are opened lazily, round-robin across the region's URLs,
+    # up to `size`; callers wait when all of them are in use, and are woken
+    # whenever a connection is returned or a broken one is discarded.
+    # The gateway_region() of each connection is looked up once, when opened.
+    def __init__(self, urls: list, size: int):
+        self.urls = itertools.cycle(urls)
+        self.size = size
+        self.idle = []
+        self.created = 0
+        self.gateways = {}
+        self.cond = threading.Condition()
+
+
+    def grow(self, n: int = 1):
+        with self.cond:
+            self.size += n
+            self.cond.notify(n)
+
+
+    def acquire(self) -> psycopg.Connection:
+        with self.cond:
+            while not self.idle and self.created >= self.size:
+                self.cond.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.created += 1
+            url = next(self.urls)
+
+        try:
+            conn = psycopg.connect(url, autocommit=True)
+            self.gateways[conn] = conn.execute("SELECT gateway_region()").fetchone()[0]
+            return conn
+        except Exception:
+            with self.cond:
+                self.created -= 1
+                self.cond.notify()
+            raise
+
+
+    def release(self, conn: psycopg.Connection):
+        # a failed statement leaves an autocommit connection usable;
+        # only drop the ones that are actually gone
+        discard = conn.broken or conn.closed
+        if discard:
+            conn.close()
+            self.gateways.pop(conn, None)
+
+        with self.cond:
+            if discard:
+                self.created -= 1
+            else:
+                self.idle.append(conn)
+            self.cond.notify()
+
+
+    def gateway(self, conn: psycopg.Connection) -> str:
+        return self.gateways.get(conn)
+
+
+    def close(self):
+        with self.cond:
+            idle, self.idle = self.idle, []
+            self.created -= len(idle)
+        for conn in idle:
+            conn.close()
+            self.gateways.pop(conn, None)
+
+
+
+class RegionStats:
+    def __init__(self):
+        self.samples = []
+        self.waits = []
+
+
+    def add(self, elapsed: float, wait: float):
+        self.samples.append(elapsed)
+        self.waits.append(wait)
+
+
+    def summary(self) -> str:
+        ordered = sorted(self.samples)
+        n = len(ordered)
+        return (
+            f"writes={n} "
+            f"mean={sum(ordered) / n * 1000:.2f}ms "
+            f"p50={ordered[int(0.50 * (n - 1))] * 1000:.2f}ms "
+            f"p99={ordered[int(0.99 * (n - 1))] * 1000:.2f}ms "
+            f"max={ordered[-1] * 1000:.2f}ms "
+            f"pool wait mean={sum(self.waits) / n * 1000:.2f}ms "
+            f"max={max(self.waits) * 1000:.2f}ms"
+        )
+
+
+
+class RegionRouter:
+    # Sends each write to a gateway in the row's region.
+    #
+    # routes = {
+    #     "tx1": "postgresql://...",             a single gateway, or
+    #     "tx2": ["postgresql://...", ...]       several gateways for the region
+    # }
+    #
+    # Rows whose region has no route go through the fallback connection
+    # supplied by the caller (the one dbworkload hands to the workload).
+    # A write counts as local when the gateway_region() of the connection
+    # it went through matches the row's region.
+    # Routers are shared by all workload threads in a process, keyed by
+    # their configuration, so the pools and the statistics are too.
+    #
+    # Each routed region gets a pool of `pool_size` connections. By default
+    # (pool_size None) the pools grow by one connection for every workload
+    # thread that attaches to the router, so routing never caps concurrency
+    # below dbworkload's own. Write latency includes any wait for a pooled
+    # connection, which is also reported on its own.
+    #
+    # Statistics are printed every `report_every` writes or `report_interval`
+    # seconds, whichever comes first, and cover the writes since the
+    # previous report. dbworkload runs workloads in multiprocessing
+    # processes, where atexit handlers never run; the final report and
+    # closing the pools are registered as a multiprocessing finalizer,
+    # which runs when the process shuts down gracefully.
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+
+    @classmethod
+    def shared(cls, routes: dict, pool_size: int = None, report_every: int = 1000, report_interval: float = 10):
+        key = json.dumps([routes, pool_size, report_every, report_interval], sort_keys=True)
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(routes, pool_size, report_every, report_interval)
+            return cls._shared[key]
+
+
+    def __init__(self, routes: dict, pool_size: int = None, report_every: int = 1000, report_interval: float = 10):
+        if pool_size is not None and pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+
+        self.pool_size = pool_size
+        self.pools = {
+            region: RegionPool(urls if isinstance(urls, list) else [urls], pool_size or 0)
+            for region, urls in routes.items()
+        }
+        self.report_every = report_every
+        self.report_interval = report_interval
+        self.total = 0
+        self.lock = threading.Lock()
+        self.reset()
+        util.Finalize(self, self.close, exitpriority=10)
+
+
+    def attach(self):
+        # called once by every workload thread using this router
+        if self.pool_size is None:
+            for pool in self.pools.values():
+                pool.grow()
+
+
+    def reset(self):
+        self.stats = collections.defaultdict(RegionStats)
+        self.local = 0
+        self.remote = 0
+        self.window_start = time.monotonic()
+
+
+    @contextmanager
+    def connection(self, region: str, fallback: psycopg.Connection, fallback_region: str = None):
+        start = time.perf_counter()
+        pool = self.pools.get(region)
+        if pool:
+            conn = pool.acquire()
+            gateway = pool.gateway(conn)
+        else:
+            conn = fallback
+            gateway = fallback_region
+        wait = time.perf_counter() - start
+
+        try:
+            yield conn
+        finally:
+            if pool:
+                pool.release(conn)
+
+        self.record(region, time.perf_counter() - start, wait, gateway == region)
+
+
+    def record(self, region: str, elapsed: float, wait: float, local: bool):
+        with self.lock:
+            self.stats[region].add(elapsed, wait)
+            if local:
+                self.local += 1
+            else:
+                self.remote += 1
+            writes = self.local + self.remote
+            due = (
+                (self.report_every and writes >= self.report_every)
+                or (self.report_interval and time.monotonic() - self.window_start >= self.report_interval)
+            )
+
+        if due:
+            self.report()
+
+
+    def report(self):
+        with self.lock:
+            writes = self.local + self.remote
+            if writes == 0:
+                return
+
+            self.total += writes
+            lines = [
+                f"Routing: {writes} writes in the last {time.monotonic() - self.window_start:.1f}s "
+                f"({self.total} total), "
+                f"local {self.local / writes * 100:.1f}% / remote {self.remote / writes * 100:.1f}%"
+            ]
+            for region, s in sorted(self.stats.items()):
+                lines.append(
+                    f"  {region}: {s.summary()}"
+                    f"{'' if region in self.pools else ' (fallback)'}"
+                )
+            self.reset()
+
+        print("\n".join(lines))
+
+
+    def close(self):
+        self.report()
+        for pool in self.pools.values():
+            pool.close()
@@ -0,0 +1,231 @@
+import os
+import struct
+import sys
+import uuid
+
+import pytest
+
+pl = pytest.importorskip("polars")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dbworkload"))
+
+import DatapointTrace
+from DatapointTrace import TraceReader, TraceRecorder
+
+
+class FakeClock:
+    # Stands in for the time module in DatapointTrace: perf_counter() only
+    # moves when advanced or slept on, and every sleep is recorded.
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(DatapointTrace, "time", clock)
+    return clock
+
+
+def float32(x):
+    return struct.unpack("f", struct.pack("f", x))[0]
+
+
+def datapoint(i):
+    return {
+        "station":   str(uuid.UUID(int=i)),
+        "region":    f"tx{i % 3 + 1}",
+        "date":      f"2025-01-01 00:00:{i % 60:02d}.{i:06d}",
+        "param0":    i,
+        "param1":    -i,
+        "param2":    round(i / 3, 3),
+        "param3":    round(i / 7, 2),
+        "param4":    f"P{i}",
+        "param5":    f'{{"i": {i}}}',
+        "embedding": [float32(i / (k + 1)) for k in range(384)]
+    }
+
+
+def record(path, clock, id, rows, period, chunk_size=4, first=0):
+    recorder = TraceRecorder(str(path), id, chunk_size=chunk_size, flush_interval=0)
+    for i in range(first, first + rows):
+        recorder.add(datapoint(i))
+        clock.now += period
+    recorder.flush()
+
+
+def take(rows, n):
+    return [next(rows) for _ in range(n)]
+
+
+def test_replay_preserves_every_field(tmp_path, clock):
+    record(tmp_path, clock, 0, 10, 0.1)
+
+    for original, replayed in zip(map(datapoint, range(10)), take(TraceReader(str(tmp_path), 0, 1).rows(), 10)):
+        assert replayed["date"].strftime(DatapointTrace.DATE_FORMAT) == original.pop("date")
+        replayed.pop("date")
+        assert replayed == original
+
+
+def test_speed_zero_never_sleeps(tmp_path, clock):
+    record(tmp_path, clock, 0, 10, 1.0)
+
+    take(TraceReader(str(tmp_path), 0, 1, speed=0).rows(), 10)
+    assert clock.sleeps == []
+
+
+@pytest.mark.parametrize("speed", [1, 2])
+def test_replay_follows_recorded_offsets(tmp_path, clock, speed):
+    record(tmp_path, clock, 0, 10, 0.5)
+
+    clock.now = 100.0
+    take(TraceReader(str(tmp_path), 0, 1, speed=speed).rows(), 10)
+    assert clock.now - 100.0 == pytest.approx(9 * 0.5 / speed)
+
+
+def test_each_reader_replays_one_recorder_at_its_rate(tmp_path, clock):
+    # two threads recorded side by side, at different rates
+    record(tmp_path, clock, 0, 12, 0.5, first=0)
+    clock.now = 0.0
+    record(tmp_path, clock, 1, 12, 0.25, first=100)
+
+    for id, first, period in [(0, 0, 0.5), (1, 100, 0.25)]:
+        clock.now = 0.0
+        rows = take(TraceReader(str(tmp_path), id, 2, speed=1).rows(), 12)
+        assert [r["param0"] for r in rows] == list(range(first, first + 12))
+        assert clock.now == pytest.approx(11 * period)
+
+
+def recorders(tmp_path, id, total):
+    return [
+        sorted({os.path.basename(f).split("-")[0] for f in chunks})
+        for chunks in TraceReader(str(tmp_path), id, total).recorders
+    ]
+
+
+def test_recorders_are_assigned_whole_to_readers(tmp_path, clock):
+    for id in range(3):
+        record(tmp_path, clock, id, 8, 0.1)
+
+    # fewer readers than recorders: some readers take several, in turn
+    assert recorders(tmp_path, 0, 2) == [["0000"], ["0002"]]
+    assert recorders(tmp_path, 1, 2) == [["0001"]]
+
+    # as many readers as recorders: one each
+    assert [recorders(tmp_path, id, 3) for id in range(3)] == [[["0000"]], [["0001"]], [["0002"]]]
+
+    # more readers than recorders: the extra readers repeat a recorder
+    assert recorders(tmp_path, 3, 5) == [["0000"]]
+    assert recorders(tmp_path, 4, 5) == [["0001"]]
+
+
+def test_recorder_flushes_on_interval(tmp_path, clock):
+    recorder = TraceRecorder(str(tmp_path), 0, chunk_size=1000, flush_interval=5)
+    for i in range(5):
+        recorder.add(datapoint(i))
+        clock.now += 2
+
+    # the row added 6s in is past the interval and is written with the chunk
+    assert len(os.listdir(tmp_path)) == 1
+    assert pl.read_ipc(os.path.join(tmp_path, "*.arrow"))["param0"].to_list() == [0, 1, 2, 3]
+    assert [dp["param0"] for _, dp in recorder.rows] == [4]
+
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        return self
+
+    def fetchone(self):
+        return (uuid.uuid4(), "tx1")
+
+
+class FakeConnection:
+    def cursor(self):
+        return FakeCursor()
+
+
+def workload(args):
+    psycopg = pytest.importorskip("psycopg")
+    pytest.importorskip("sentence_transformers")
+    from DatapointTransactions import Datapointtransactions
+
+    w = Datapointtransactions(args)
+    w.embed_text = lambda text: [float32(len(text) / (k + 1)) for k in range(384)]
+    w.written = []
+    w.upsert_datapoint = lambda conn, dp: w.written.append(dict(dp))
+    w.setup(FakeConnection(), 0, 1)
+    return w, psycopg
+
+
+def test_workload_replays_exactly_what_it_recorded(tmp_path, clock):
+    recorder, _ = workload({"record": str(tmp_path), "record_chunk": 4})
+    for _ in range(10):
+        recorder.sql_insert_datapoint(FakeConnection())
+    recorder.recorder.flush()
+
+    replayer, _ = workload({"replay": str(tmp_path)})
+    for _ in range(10):
+        replayer.sql_insert_datapoint(FakeConnection())
+
+    assert len(replayer.written) == len(recorder.written) == 10
+    for original, replayed in zip(recorder.written, replayer.written):
+        assert replayed["date"].strftime(DatapointTrace.DATE_FORMAT) == original.pop("date")
+        replayed.pop("date")
+        # the vector literal sent to the database is rebuilt exactly
+        assert replayed["param6"] == original["param6"]
+        assert replayed == {k: v for k, v in original.items() if k != "interval"}
+
+
+def test_workload_retries_the_same_replayed_row(tmp_path, clock):
+    record(tmp_path, clock, 0, 3, 0.1)
+    w, psycopg = workload({"replay": str(tmp_path)})
+
+    attempts = []
+
+    def upsert(conn, dp):
+        attempts.append(dp["param0"])
+        if len(attempts) == 1:
+            raise psycopg.errors.SerializationFailure()
+
+    w.upsert_datapoint = upsert
+    with pytest.raises(psycopg.errors.SerializationFailure):
+        w.sql_insert_datapoint(FakeConnection())
+    for _ in range(3):
+        w.sql_insert_datapoint(FakeConnection())
+
+    assert attempts == [0, 0, 1, 2]
+
+
+def test_workload_records_only_written_rows(tmp_path, clock):
+    w, _ = workload({"record": str(tmp_path)})
+
+    def upsert(conn, dp):
+        raise RuntimeError("write failed")
+
+    w.upsert_datapoint = upsert
+    with pytest.raises(RuntimeError):
+        w.sql_insert_datapoint(FakeConnection())
+    assert w.recorder.rows == []
+
+
+def test_workload_rejects_record_with_replay(tmp_path):
+    pytest.importorskip("psycopg")
+    pytest.importorskip("sentence_transformers")
+    from DatapointTransactions import Datapointtransactions
+
+    with pytest.raises(ValueError):
+        Datapointtransactions({"record": str(tmp_path), "replay": str(tmp_path)})
@@ -0,0 +1,197 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("psycopg")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dbworkload"))
+
+import RegionRouter as region_router
+from RegionRouter import RegionPool, RegionRouter
+
+
+# gateway_region() reported by each fake endpoint
+GATEWAYS = {
+    "tx1-a": "tx1",
+    "tx1-b": "tx1",
+    "tx2-a": "tx2",
+    "local": "tx1",
+}
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def fetchone(self):
+        return (self.value,)
+
+
+class FakeConnection:
+    def __init__(self, url):
+        self.url = url
+        self.closed = False
+        self.broken = False
+
+    def execute(self, query):
+        return FakeResult(GATEWAYS[self.url])
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connects(monkeypatch):
+    opened = []
+
+    def connect(url, autocommit=False):
+        if url not in GATEWAYS:
+            raise region_router.psycopg.OperationalError(f"cannot connect to {url}")
+        conn = FakeConnection(url)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(region_router.psycopg, "connect", connect)
+    return opened
+
+
+def test_pool_opens_connections_lazily_and_reuses_them(connects):
+    pool = RegionPool(["tx1-a", "tx1-b"], 2)
+    assert pool.created == 0
+
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    assert len(connects) == 1
+
+    second = pool.acquire()
+    assert pool.created == 2
+    assert [c.url for c in connects] == ["tx1-a", "tx1-b"]
+    assert pool.gateway(second) == "tx1"
+
+
+def test_pool_discards_broken_connections(connects):
+    pool = RegionPool(["tx1-a"], 1)
+    conn = pool.acquire()
+    conn.broken = True
+    pool.release(conn)
+
+    assert conn.closed
+    assert pool.created == 0
+    assert pool.gateway(conn) is None
+    assert pool.acquire() is not conn
+
+
+def test_waiter_fails_instead_of_hanging_when_gateway_goes_down(connects):
+    pool = RegionPool(["tx1-a"], 1)
+    conn = pool.acquire()
+    outcome = []
+
+    def waiter():
+        try:
+            outcome.append(pool.acquire())
+        except Exception as e:
+            outcome.append(e)
+
+    t = threading.Thread(target=waiter, daemon=True)
+    t.start()
+    time.sleep(0.05)
+    assert not outcome
+
+    # the gateway goes away, taking the only connection with it
+    pool.urls = iter(["down"])
+    conn.broken = True
+    pool.release(conn)
+
+    t.join(timeout=2)
+    assert not t.is_alive()
+    assert isinstance(outcome[0], region_router.psycopg.OperationalError)
+    assert pool.created == 0
+
+
+def test_waiter_gets_released_connection(connects):
+    pool = RegionPool(["tx1-a"], 1)
+    conn = pool.acquire()
+    outcome = []
+
+    t = threading.Thread(target=lambda: outcome.append(pool.acquire()), daemon=True)
+    t.start()
+    time.sleep(0.05)
+    pool.release(conn)
+
+    t.join(timeout=2)
+    assert outcome == [conn]
+
+
+def test_shared_routers_are_keyed_by_configuration(connects):
+    routes = {"tx1": "tx1-a"}
+    assert RegionRouter.shared(routes, 2) is RegionRouter.shared({"tx1": "tx1-a"}, 2)
+    assert RegionRouter.shared(routes, 2) is not RegionRouter.shared(routes, 3)
+    assert RegionRouter.shared(routes, 2) is not RegionRouter.shared({"tx1": "tx1-b"}, 2)
+
+
+def test_pools_grow_with_attached_threads_by_default(connects):
+    router = RegionRouter({"tx1": "tx1-a", "tx2": "tx2-a"})
+    for _ in range(3):
+        router.attach()
+    assert [p.size for p in router.pools.values()] == [3, 3]
+
+    router = RegionRouter({"tx1": "tx1-a"}, pool_size=2)
+    router.attach()
+    assert router.pools["tx1"].size == 2
+
+    with pytest.raises(ValueError):
+        RegionRouter({"tx1": "tx1-a"}, pool_size=0)
+
+
+def test_local_and_remote_writes_use_the_actual_gateway_region(connects):
+    # tx2 is mapped to an endpoint whose gateway is in tx1
+    router = RegionRouter({"tx1": "tx1-a", "tx2": "local"}, pool_size=1, report_every=0, report_interval=0)
+
+    for region in ["tx1", "tx2", "tx3", "tx4"]:
+        with router.connection(region, "fallback", "tx3") as conn:
+            if region in ("tx3", "tx4"):
+                assert conn == "fallback"
+
+    assert (router.local, router.remote) == (2, 2)
+    assert sorted(router.stats) == ["tx1", "tx2", "tx3", "tx4"]
+
+
+def test_latency_includes_pool_wait(connects):
+    router = RegionRouter({"tx1": "tx1-a"}, pool_size=1, report_every=0, report_interval=0)
+    held = router.pools["tx1"].acquire()
+
+    def give_back():
+        time.sleep(0.05)
+        router.pools["tx1"].release(held)
+
+    threading.Thread(target=give_back).start()
+    with router.connection("tx1", None):
+        pass
+
+    stats = router.stats["tx1"]
+    assert stats.waits[0] >= 0.04
+    assert stats.samples[0] >= stats.waits[0]
+
+
+def test_reports_cover_the_writes_since_the_previous_report(connects, capsys):
+    router = RegionRouter({"tx1": "tx1-a"}, pool_size=1, report_every=3, report_interval=0)
+
+    for region in ["tx1", "tx1", "tx2"]:
+        with router.connection(region, "fallback", "tx1"):
+            pass
+    out = capsys.readouterr().out
+    assert "3 writes" in out and "(3 total)" in out
+    assert "local 66.7% / remote 33.3%" in out
+    assert (router.local, router.remote) == (0, 0)
+    assert not router.stats
+
+    with router.connection("tx1", "fallback"):
+        pass
+    router.report()
+    out = capsys.readouterr().out
+    assert "1 writes" in out and "(4 total)" in out
+    assert "tx2" not in out